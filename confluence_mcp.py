@@ -1,9 +1,14 @@
 import os
-import requests
+import json
 from fastmcp import FastMCP
 from dotenv import load_dotenv
 import datetime
 import httpx
+import orjson
+from typing import Any
+from cachetools import LRUCache
+from http_utils import (CACHE_MAXSIZE, UpstreamClient, basic_auth_header, cached, clients_lifespan,
+                        gather_bounded, ok, use_uvloop)
 # Load env vars
 load_dotenv()
 # ==========================
@@ -18,35 +23,113 @@ if not (CONFLUENCE_BASE_URL and CONFLUENCE_USER and CONFLUENCE_TOKEN):
     raise ValueError("Missing Confluence environment variables. "
                      "Please set CONFLUENCE_BASE_URL, CONFLUENCE_USER, and CONFLUENCE_TOKEN.")
 
-auth: tuple[str, str] = (CONFLUENCE_USER, CONFLUENCE_TOKEN)
-headers = {"Content-Type": "application/json"}
-
-mcp = FastMCP("Confluence MCP")
+headers = {
+    "Authorization": basic_auth_header(CONFLUENCE_USER, CONFLUENCE_TOKEN),
+    "Content-Type": "application/json",
+}
 
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
-HEADERS = {"Authorization": f"token {GITHUB_TOKEN}"} if GITHUB_TOKEN else {}
+HEADERS = {"Content-Type": "application/json"}
+if GITHUB_TOKEN:
+    HEADERS["Authorization"] = f"token {GITHUB_TOKEN}"
 
 BASE_URL = "https://api.github.com"
 
+# ==========================
+# HTTP Clients
+# ==========================
+# follow_redirects keeps the redirect handling these calls had under requests.
+CONFLUENCE_CLIENT = UpstreamClient(CONFLUENCE_BASE_URL, headers=headers, follow_redirects=True)
+# GitHub traffic is mostly ETag-revalidated polling over a single HTTP/2
+# connection, and GitHub penalises wide fan-out, so keep its pool small.
+GITHUB_CLIENT = UpstreamClient(BASE_URL, headers=HEADERS,
+                               limits=httpx.Limits(max_keepalive_connections=2, max_connections=32))
+
+mcp = FastMCP("Confluence MCP", lifespan=clients_lifespan(CONFLUENCE_CLIENT, GITHUB_CLIENT))
+
+# ==========================
+# Page Streaming Helpers
+# ==========================
+SUMMARY_LENGTH = 500
+# Bytes of body.storage.value to read before dropping the rest of the page.
+# The worst case is 12 bytes per char: a non-BMP char escaped as a
+# \uXXXX\uXXXX surrogate pair. One extra char covers the escape that
+# _json_string_prefix may trim at the cut.
+SUMMARY_READ_BYTES = (SUMMARY_LENGTH + 1) * 12
+_STORAGE_VALUE_MARKER = b'"storage":{"value":"'
+
+
+def _json_string_prefix(raw: bytes) -> tuple[str, bool]:
+    """
+    Decode the start of a JSON string literal whose tail may not have been read.
+    Returns (value, truncated).
+    """
+    text = raw.decode("utf-8", errors="ignore")
+    try:
+        # The whole string fit in the window.
+        return json.decoder.scanstring(text, 0, False)[0], False
+    except ValueError:
+        pass
+    # Cut off any half-received escape sequence (at most 6 chars, e.g. \u00e9)
+    # so the literal can be closed and decoded.
+    cut = text.rfind("\\", max(0, len(text) - 6))
+    if cut >= 0:
+        text = text[:cut]
+    if (len(text) - len(text.rstrip("\\"))) % 2:
+        text = text[:-1]
+    value = json.decoder.scanstring(text + '"', 0, False)[0]
+    if value and "\ud800" <= value[-1] <= "\udbff":
+        value = value[:-1]  # high surrogate whose pair was cut off
+    return value, True
+
+
+async def _read_page_storage(page_id: str) -> tuple[str, bool]:
+    """
+    Stream a page and return (storage value, truncated).
+    Stops reading SUMMARY_READ_BYTES into body.storage.value, so large pages
+    are never fully downloaded or parsed.
+    """
+    buf = bytearray()
+    start = -1
+    async with CONFLUENCE_CLIENT.stream("GET", f"/rest/api/content/{page_id}",
+                                        params={"expand": "body.storage"}) as resp:
+        resp.raise_for_status()
+        async for chunk in resp.aiter_bytes(4096):
+            searched = max(0, len(buf) - len(_STORAGE_VALUE_MARKER))
+            buf += chunk
+            if start < 0:
+                idx = buf.find(_STORAGE_VALUE_MARKER, searched)
+                if idx >= 0:
+                    start = idx + len(_STORAGE_VALUE_MARKER)
+            if start >= 0 and len(buf) - start > SUMMARY_READ_BYTES:
+                return _json_string_prefix(bytes(buf[start:start + SUMMARY_READ_BYTES]))
+
+    return orjson.loads(buf)["body"]["storage"]["value"], False
+
 # ==========================
 # Tools
 # ==========================
 
-@mcp.tool()
-def summarize_page(page_id: str) -> str:
-    """Fetch and summarize a Confluence page by ID."""
-    url = f"{CONFLUENCE_BASE_URL}/rest/api/content/{page_id}?expand=body.storage"
-    resp = requests.get(url, auth=auth, headers=headers)
-    resp.raise_for_status()
-    content = resp.json()["body"]["storage"]["value"]
+async def _summarize(page_id: str) -> str:
+    content, truncated = await _read_page_storage(page_id)
 
     # Simple summarization (truncate). Swap with LLM if desired.
-    summary = content[:500] + "..." if len(content) > 500 else content
+    summary = content[:SUMMARY_LENGTH] + "..." if truncated or len(content) > SUMMARY_LENGTH else content
     return f"Summary of page {page_id}: {summary}"
 
+@mcp.tool()
+async def summarize_page(page_id: str) -> str:
+    """Fetch and summarize a Confluence page by ID."""
+    return await _summarize(page_id)
+
+@mcp.tool()
+async def summarize_pages(page_ids: list[str]) -> list[str | dict]:
+    """Fetch and summarize several Confluence pages concurrently, in the given order."""
+    return await gather_bounded(_summarize, page_ids)
+
 
 @mcp.tool()
-def create_page(body: str) -> dict:
+async def create_page(body: str) -> dict:
     """
     Create a new Confluence page in the given space.
     - title auto-generated as current date + time
@@ -58,7 +141,6 @@ def create_page(body: str) -> dict:
     # auto-generate title with timestamp
     title = f"Conversation - {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
 
-    url = f"{CONFLUENCE_BASE_URL}/rest/api/content"
     payload = {
         "type": "page",
         "title": title,
@@ -71,83 +153,123 @@ def create_page(body: str) -> dict:
         }
     }
 
-    resp = requests.post(url, auth=auth, headers=headers, json=payload)
-    resp.raise_for_status()
-    return resp.json()
+    resp = await CONFLUENCE_CLIENT.post("/rest/api/content", content=orjson.dumps(payload))
+    return ok(resp)
 
-@mcp.tool()
-def navigate_spaces(limit: int = 10) -> list:
-    """List spaces available in Confluence."""
-    url = f"{CONFLUENCE_BASE_URL}/rest/api/space?limit={limit}"
-    resp = requests.get(url, auth=auth, headers=headers)
-    resp.raise_for_status()
-    spaces = resp.json().get("results", [])
+@cached()
+async def _fetch_spaces(limit: int) -> list:
+    resp = await CONFLUENCE_CLIENT.get("/rest/api/space", params={"limit": limit})
+    spaces = ok(resp).get("results", [])
     return [{"key": s["key"], "name": s["name"]} for s in spaces]
 
+@mcp.tool()
+async def navigate_spaces(limit: int = 10, fresh: bool = False) -> list:
+    """
+    List spaces available in Confluence.
+    - fresh: skip the short-lived response cache
+    """
+    return await _fetch_spaces(limit, fresh=fresh)
+
+# ---------- GitHub Helpers ----------
+
+# URL -> (ETag, parsed body) of the last 200 response seen for that URL,
+# bounded so a long-running server does not keep every URL it has seen.
+_ETAG_CACHE: LRUCache[str, tuple[str, Any]] = LRUCache(maxsize=CACHE_MAXSIZE)
+
+
+async def gh_get(path: str, params: dict | None = None) -> Any:
+    """
+    Conditional GET against the GitHub API.
+    Replays the cached ETag as If-None-Match; a 304 reuses the cached body and
+    does not count against the rate limit.
+    """
+    key = str(httpx.URL(path, params=params))
+    entry = _ETAG_CACHE.get(key)
+    request_headers = {"If-None-Match": entry[0]} if entry else None
+
+    resp = await GITHUB_CLIENT.get(path, params=params, headers=request_headers)
+    if resp.status_code == 304 and entry:
+        return entry[1]
+
+    data = ok(resp)
+    etag = resp.headers.get("ETag")
+    if etag:
+        _ETAG_CACHE[key] = (etag, data)
+    return data
+
 # ---------- PR Tools ----------
 
+async def _fetch_pull_requests(owner: str, repo: str, state: str) -> list[dict]:
+    pulls = await gh_get(f"/repos/{owner}/{repo}/pulls", params={"state": state})
+    return [{"number": pr["number"], "title": pr["title"], "state": pr["state"], "user": pr["user"]["login"]}
+            for pr in pulls]
+
 @mcp.tool()
-def list_pull_requests(owner: str, repo: str, state: str = "open") -> list[dict]:
+async def list_pull_requests(owner: str, repo: str, state: str = "open") -> list[dict]:
     """List pull requests in a repo (default: open)"""
-    url = f"{BASE_URL}/repos/{owner}/{repo}/pulls?state={state}"
-    resp = httpx.get(url, headers=HEADERS)
-    if resp.status_code != 200:
-        return [{"error": resp.text}]
-    return [{"number": pr["number"], "title": pr["title"], "state": pr["state"], "user": pr["user"]["login"]}
-            for pr in resp.json()]
+    return await _fetch_pull_requests(owner, repo, state)
 
 @mcp.tool()
-def create_pull_request(title: str, body: str = "") -> dict:
+async def list_pull_requests_many(repos: list[str], state: str = "open") -> dict[str, list[dict] | dict]:
+    """
+    List pull requests for several repos concurrently.
+    - repos: repositories as "owner/repo"; malformed entries get an error
+    - state: PR state filter applied to every repo (default: open)
+    """
+    async def fetch(full_name: str) -> list[dict] | dict:
+        owner, sep, repo = full_name.partition("/")
+        if not (sep and owner and repo) or "/" in repo:
+            return {"error": f"expected 'owner/repo', got {full_name!r}"}
+        return await _fetch_pull_requests(owner, repo, state)
+
+    return dict(zip(repos, await gather_bounded(fetch, repos)))
+
+@mcp.tool()
+async def create_pull_request(title: str, body: str = "") -> dict:
     """
     Create a pull request.
     - title: title of the PR
     - body: description of the PR 
     """
-    url = f"{BASE_URL}/repos/agrayush2304-afk/Hackathon/pulls"
     payload = {"title": title, "head": "dev", "base": "main", "body": body}
-    resp = httpx.post(url, json=payload, headers=HEADERS)
-    if resp.status_code not in (200, 201):
-        return {"error": resp.text}
-    return resp.json()
+    resp = await GITHUB_CLIENT.post("/repos/agrayush2304-afk/Hackathon/pulls", content=orjson.dumps(payload))
+    return ok(resp)
 
 # ---------- NEW: PR Review & Comment Tools ----------
 
 @mcp.tool()
-def comment_on_pull_request(pr_number: int, body: str) -> dict:
+async def comment_on_pull_request(pr_number: int, body: str) -> dict:
     """Add a comment to a pull request"""
-    url = f"{BASE_URL}/repos/agrayush2304-afk/Hackathon/issues/{pr_number}/comments"
-    resp = httpx.post(url, json={"body": body}, headers=HEADERS)
-    if resp.status_code not in (200, 201):
-        return {"error": resp.text}
-    return resp.json()
+    resp = await GITHUB_CLIENT.post(f"/repos/agrayush2304-afk/Hackathon/issues/{pr_number}/comments",
+                                    content=orjson.dumps({"body": body}))
+    return ok(resp)
 
 @mcp.tool()
-def review_pull_request(owner: str, repo: str, pr_number: int, body: str, event: str = "COMMENT") -> dict:
+async def review_pull_request(owner: str, repo: str, pr_number: int, body: str, event: str = "COMMENT") -> dict:
     """
     Review a pull request.
     event can be: COMMENT, APPROVE, REQUEST_CHANGES
     """
-    url = f"{BASE_URL}/repos/{owner}/{repo}/pulls/{pr_number}/reviews"
     payload = {"body": body, "event": event}
-    resp = httpx.post(url, json=payload, headers=HEADERS)
-    if resp.status_code not in (200, 201):
-        return {"error": resp.text}
-    return resp.json()
+    resp = await GITHUB_CLIENT.post(f"/repos/{owner}/{repo}/pulls/{pr_number}/reviews",
+                                    content=orjson.dumps(payload))
+    return ok(resp)
 
 # ---------- Resource ----------
 
+@cached()
+async def _fetch_user_profile(username: str) -> dict:
+    return await gh_get(f"/users/{username}")
+
 @mcp.resource("github://{username}")
-def get_user_profile(username: str) -> dict:
+async def get_user_profile(username: str) -> dict:
     """Fetch a GitHub user profile"""
-    url = f"{BASE_URL}/users/{username}"
-    resp = httpx.get(url, headers=HEADERS)
-    if resp.status_code != 200:
-        return {"error": resp.text}
-    return resp.json()
+    return await _fetch_user_profile(username)
 
 
 # ==========================
 # Run MCP
 # ==========================
 if __name__ == "__main__":
+    use_uvloop()
     mcp.run(transport="streamable-http", host="0.0.0.0", port=8000)
@@ -0,0 +1,372 @@
+import asyncio
+import base64
+import copy
+import random
+import socket
+import ssl
+import time
+import datetime
+import email.utils
+import functools
+import inspect
+from contextlib import asynccontextmanager
+import certifi
+import httpx
+import orjson
+from cachetools import TTLCache
+
+# ==========================
+# Retry / Rate-limit Settings
+# ==========================
+MAX_ATTEMPTS = 3
+MAX_BACKOFF = 30.0          # seconds; also the longest we will wait for a rate-limit reset
+MAX_CONCURRENCY = 64        # in-flight requests per host
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+# HTTP/2 multiplexes concurrent requests over one connection per host, so only
+# a few sockets need to stay warm; max_connections still covers hosts that
+# negotiate HTTP/1.1.
+LIMITS = httpx.Limits(max_keepalive_connections=4, max_connections=100)
+
+# Loading the CA bundle is the expensive part of building an SSLContext, so
+# every client shares this one instead of each transport building its own.
+SSL_CONTEXT = ssl.create_default_context(cafile=certifi.where())
+
+
+def _parse_retry_after(value: str) -> float | None:
+    """Retry-After is either delta-seconds or an HTTP date."""
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def _parse_reset(value: str) -> float | None:
+    """
+    Seconds until X-RateLimit-Reset.
+    GitHub sends epoch seconds, Atlassian sends an ISO-8601 timestamp.
+    """
+    try:
+        reset_at = float(value)
+    except ValueError:
+        try:
+            reset_at = datetime.datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            return None
+    return max(0.0, reset_at - time.time())
+
+
+class _HostState:
+    def __init__(self, max_concurrency: int):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.lock = asyncio.Lock()
+        self.remaining: int | None = None   # None = unknown, let requests through
+        self.reset_at = 0.0                 # time.monotonic() when the bucket refills
+
+
+class HostRateLimiter:
+    """
+    Proactive per-host limiter.
+    Caps concurrency per host and keeps a token bucket fed from the upstream's
+    X-RateLimit-Remaining / X-RateLimit-Reset / Retry-After headers, so callers
+    wait for the reset instead of burning requests on 429s.
+    """
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY):
+        self._max_concurrency = max_concurrency
+        self._hosts: dict[str, _HostState] = {}
+
+    def _state(self, host: str) -> _HostState:
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _HostState(self._max_concurrency)
+        return state
+
+    async def acquire(self, host: str) -> None:
+        state = self._state(host)
+        await state.semaphore.acquire()
+        try:
+            async with state.lock:
+                if state.remaining is None:
+                    return
+                if state.remaining <= 0:
+                    delay = state.reset_at - time.monotonic()
+                    # A reset further out than MAX_BACKOFF is not worth blocking
+                    # a tool call for; let the upstream reject it instead.
+                    if 0 < delay <= MAX_BACKOFF:
+                        await asyncio.sleep(delay)
+                    state.remaining = None
+                    return
+                state.remaining -= 1
+        except BaseException:
+            state.semaphore.release()
+            raise
+
+    def release(self, host: str) -> None:
+        self._state(host).semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self, host: str):
+        await self.acquire(host)
+        try:
+            yield
+        finally:
+            self.release(host)
+
+    def update(self, host: str, headers: httpx.Headers) -> None:
+        """Refresh the bucket for `host` from a response's rate-limit headers."""
+        state = self._state(host)
+        retry_after = headers.get("Retry-After")
+        delay = _parse_retry_after(retry_after) if retry_after else None
+        if delay is not None:
+            state.remaining = 0
+            state.reset_at = time.monotonic() + delay
+            return
+
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        if remaining is None:
+            return
+        try:
+            state.remaining = int(remaining)
+        except ValueError:
+            return
+        delay = _parse_reset(reset) if reset else None
+        if delay is not None:
+            state.reset_at = time.monotonic() + delay
+
+
+LIMITER = HostRateLimiter()
+
+
+def _backoff(attempt: int, response: httpx.Response | None = None) -> float | None:
+    """
+    Exponential backoff with jitter, honouring Retry-After when given.
+    None means Retry-After is further out than MAX_BACKOFF and the request
+    should not be retried at all.
+    """
+    if response is not None and "Retry-After" in response.headers:
+        delay = _parse_retry_after(response.headers["Retry-After"])
+        if delay is not None:
+            return delay if delay <= MAX_BACKOFF else None
+    return min(MAX_BACKOFF, 2 ** (attempt - 1)) + random.uniform(0, 0.5)
+
+
+class RateLimitedTransport(httpx.AsyncBaseTransport):
+    """
+    Wraps a transport with the shared host limiter and retries.
+    429 is retried for every method; 5xx and connection errors only for
+    idempotent methods so a create/comment is never sent twice.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, limiter: HostRateLimiter = LIMITER):
+        self._transport = transport
+        self._limiter = limiter
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        idempotent = request.method in IDEMPOTENT_METHODS
+
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            last_attempt = attempt == MAX_ATTEMPTS
+            async with self._limiter.slot(host):
+                try:
+                    response = await self._transport.handle_async_request(request)
+                except httpx.TransportError:
+                    if last_attempt or not idempotent:
+                        raise
+                    response = None
+
+            delay = _backoff(attempt, response)
+            if response is not None:
+                self._limiter.update(host, response.headers)
+                status = response.status_code
+                retryable = status == 429 or (idempotent and status in RETRY_STATUSES)
+                # Same rule as the limiter: a Retry-After beyond MAX_BACKOFF is
+                # not worth blocking a tool call for, so hand the response back.
+                if last_attempt or not retryable or delay is None:
+                    return response
+                await response.aclose()
+
+            await asyncio.sleep(delay)
+
+        raise AssertionError("unreachable")
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def ok(resp: httpx.Response):
+    """
+    Parsed JSON body of a successful response.
+    Non-2xx responses raise httpx.HTTPStatusError without decoding the error
+    body; FastMCP reports the exception to the client as a tool error.
+    """
+    resp.raise_for_status()
+    return orjson.loads(resp.content)
+
+
+def basic_auth_header(user: str, secret: str) -> str:
+    """
+    `Authorization` value for HTTP Basic auth. Servers build it once at import
+    and send it as a static client header instead of re-encoding per request.
+    """
+    return "Basic " + base64.b64encode(f"{user}:{secret}".encode()).decode()
+
+
+def make_client(base_url: str, limits: httpx.Limits = LIMITS, **kwargs) -> httpx.AsyncClient:
+    """
+    Build a pooled HTTP/2 AsyncClient for one upstream, routed through the
+    shared rate limiter. Extra kwargs (headers, ...) go to httpx.AsyncClient.
+    """
+    # retries=1 re-attempts failed connects, which never reach the upstream.
+    transport = RateLimitedTransport(
+        httpx.AsyncHTTPTransport(verify=SSL_CONTEXT, http2=True, limits=limits, retries=1)
+    )
+    return httpx.AsyncClient(base_url=base_url, transport=transport, timeout=30.0, **kwargs)
+
+
+async def prewarm_dns(*urls: str) -> None:
+    """
+    Resolve each URL's host once at startup so a caching resolver is hot
+    before the first tool call. Failures are ignored; the real request will
+    surface them.
+    """
+    loop = asyncio.get_running_loop()
+    hosts = {httpx.URL(url).host for url in urls if url}
+    await asyncio.gather(
+        *(loop.getaddrinfo(host, 443, type=socket.SOCK_STREAM) for host in hosts),
+        return_exceptions=True,
+    )
+
+
+# ==========================
+# Upstream Clients
+# ==========================
+class UpstreamClient:
+    """
+    Lazily built handle for one upstream's pooled AsyncClient.
+    The underlying client is created on first use and dropped on aclose(), so
+    a server whose lifespan runs again (a new in-memory session, a restarted
+    host) gets a fresh client instead of a closed one. Attribute access
+    (get, post, stream, ...) is forwarded to the current client.
+    """
+
+    def __init__(self, base_url: str, limits: httpx.Limits = LIMITS, **kwargs):
+        self.base_url = base_url
+        self._limits = limits
+        self._kwargs = kwargs
+        self._client: httpx.AsyncClient | None = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = make_client(self.base_url, self._limits, **self._kwargs)
+        return self._client
+
+    def __getattr__(self, attr: str):
+        return getattr(self.client, attr)
+
+    async def aclose(self) -> None:
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+
+
+def clients_lifespan(*clients: UpstreamClient):
+    """
+    FastMCP lifespan for a server that owns `clients`: warm DNS for their
+    upstreams on startup, close them on shutdown. Scoped to the given clients
+    so servers mounted in one process never touch each other's pools.
+    """
+    @asynccontextmanager
+    async def lifespan(server):
+        await prewarm_dns(*(client.base_url for client in clients))
+        try:
+            yield
+        finally:
+            await asyncio.gather(*(client.aclose() for client in clients))
+
+    return lifespan
+
+
+# ==========================
+# Batching
+# ==========================
+BATCH_CONCURRENCY = 32  # in-flight requests per bulk tool call
+
+
+async def gather_bounded(fn, items, limit: int = BATCH_CONCURRENCY) -> list:
+    """
+    Await fn(item) for every item concurrently, at most `limit` at a time.
+    Results come back in the order of `items`; an item whose upstream call
+    failed (error status or transport error such as a timeout) yields
+    {"error": ...} instead of failing the whole batch.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(item):
+        async with semaphore:
+            try:
+                return await fn(item)
+            except httpx.HTTPError as exc:
+                return {"error": str(exc) or type(exc).__name__}
+
+    return await asyncio.gather(*(run(item) for item in items))
+
+
+# ==========================
+# Response Cache
+# ==========================
+CACHE_TTL = 60.0        # seconds
+CACHE_MAXSIZE = 1024    # entries per cached function
+
+
+def cached(ttl: float = CACHE_TTL, maxsize: int = CACHE_MAXSIZE):
+    """
+    LRU+TTL cache for idempotent async fetch helpers, keyed by the bound call
+    arguments. Call with fresh=True to skip the lookup (the new result is still
+    stored). Failed calls raise and are never cached. Every caller gets its
+    own deep copy, so mutating a result never corrupts the cached entry.
+    The wrapper exposes invalidate(*args, **kwargs) and cache_clear() for
+    write tools that change the cached data.
+    """
+    def decorator(fn):
+        cache: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        signature = inspect.signature(fn)
+
+        def make_key(*args, **kwargs) -> tuple:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return tuple(bound.arguments.items())
+
+        @functools.wraps(fn)
+        async def wrapper(*args, fresh: bool = False, **kwargs):
+            key = make_key(*args, **kwargs)
+            if fresh or key not in cache:
+                cache[key] = await fn(*args, **kwargs)
+            return copy.deepcopy(cache[key])
+
+        wrapper.invalidate = lambda *args, **kwargs: cache.pop(make_key(*args, **kwargs), None)
+        wrapper.cache_clear = cache.clear
+        return wrapper
+
+    return decorator
+
+
+def use_uvloop() -> None:
+    """
+    Run the server on uvloop when it is installed (it is not on Windows).
+    Call before mcp.run(); uvicorn already picks httptools up on its own.
+    """
+    try:
+        import uvloop
+    except ImportError:
+        return
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
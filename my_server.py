@@ -1,8 +1,7 @@
 import os
-import requests
 from dotenv import load_dotenv
-from requests.auth import HTTPBasicAuth
 from fastmcp import FastMCP
+from http_utils import UpstreamClient, basic_auth_header, cached, clients_lifespan, gather_bounded, ok, use_uvloop
 
 # Load env vars
 load_dotenv()
@@ -14,24 +13,41 @@ if FIVETRAN_API_KEY is None or FIVETRAN_API_SECRET is None:
     raise ValueError("FIVETRAN_API_KEY and FIVETRAN_API_SECRET must be set in environment variables.")
 
 BASE_URL = "https://api.fivetran.com/v1/connectors"
-auth = HTTPBasicAuth(FIVETRAN_API_KEY, FIVETRAN_API_SECRET)
-headers = {"Content-Type": "application/json; version=2"}
+headers = {
+    "Authorization": basic_auth_header(FIVETRAN_API_KEY, FIVETRAN_API_SECRET),
+    "Content-Type": "application/json; version=2",
+}
+
+CLIENT = UpstreamClient(BASE_URL, headers=headers, follow_redirects=True)
 
 # Init MCP
-mcp = FastMCP("My MCP Server")
+mcp = FastMCP("My MCP Server", lifespan=clients_lifespan(CLIENT))
 
 # ---------------- TOOLS ----------------
+@cached()
+async def _fetch_connector(connector_id: str) -> dict:
+    resp = await CLIENT.get(f"/{connector_id}")
+    return ok(resp)["data"]
+
+
 @mcp.tool()
-def get_connector_info(connector_id: str) -> dict:
+async def get_connector_info(connector_id: str, fresh: bool = False) -> dict:
     """
     Retrieve metadata and status for a given Fivetran connector.
+    Set fresh=True to bypass the short-lived response cache.
+    """
+    return await _fetch_connector(connector_id, fresh=fresh)
+
+
+@mcp.tool()
+async def get_connectors_info(connector_ids: list[str]) -> dict:
+    """
+    Retrieve metadata and status for several Fivetran connectors concurrently.
+    Returns a mapping of connector ID to connector data.
     """
-    url = f"{BASE_URL}/{connector_id}"
-    resp = requests.get(url, auth=auth, headers=headers)
-    print(resp.text)  # debug log
-    resp.raise_for_status()
-    return resp.json()["data"]
+    return dict(zip(connector_ids, await gather_bounded(_fetch_connector, connector_ids)))
 
 # ---------------- RUN ----------------
 if __name__ == "__main__":
-    mcp.run(transport="streamable-http", host="0.0.0.0", port=8000)
+    use_uvloop()
+    mcp.run(transport="streamable-http", host="0.0.0.0", port=int(os.getenv("PORT", 8000)))
@@ -1,8 +1,8 @@
 import os
 import psycopg2
 from dotenv import load_dotenv
-from requests.auth import HTTPBasicAuth
 from fastmcp import FastMCP
+from http_utils import use_uvloop
 
 # ─── Load environment variables ───────────────────────────────
 load_dotenv()
@@ -14,7 +14,6 @@ if FIVETRAN_API_KEY is None or FIVETRAN_API_SECRET is None:
 
 # ─── Fivetran API setup ───────────────────────────────────────
 BASE_URL = "https://api.fivetran.com/v1/connectors"
-auth = HTTPBasicAuth(FIVETRAN_API_KEY, FIVETRAN_API_SECRET)
 headers = {"Content-Type": "application/json; version=2"}
 
 # ─── Init MCP server ─────────────────────────────────────────
@@ -93,4 +92,5 @@ def get_postgres_dml(schema_name: str) -> str:
 
 # ---------------- RUN ----------------
 if __name__ == "__main__":
+    use_uvloop()
     mcp.run(transport="streamable-http", host="0.0.0.0", port=8000)
@@ -1,9 +1,9 @@
 import os
+import orjson
 import psycopg2
-import requests
 from dotenv import load_dotenv
-from requests.auth import HTTPBasicAuth
 from fastmcp import FastMCP
+from http_utils import UpstreamClient, basic_auth_header, cached, clients_lifespan, gather_bounded, ok, use_uvloop
 
 # ─── Load environment variables ───────────────────────────────
 load_dotenv()
@@ -14,17 +14,21 @@ if FIVETRAN_API_KEY is None or FIVETRAN_API_SECRET is None:
     raise ValueError("FIVETRAN_API_KEY and FIVETRAN_API_SECRET must be set in environment variables.")
 
 # ─── Fivetran API setup ───────────────────────────────────────
-BASE_URL = "https://api.fivetran.com/v1/connectors"
-auth = HTTPBasicAuth(FIVETRAN_API_KEY, FIVETRAN_API_SECRET)
-headers = {"Content-Type": "application/json; version=2"}
+BASE_URL = "https://api.fivetran.com/v1"
+headers = {
+    "Authorization": basic_auth_header(FIVETRAN_API_KEY, FIVETRAN_API_SECRET),
+    "Content-Type": "application/json; version=2",
+}
+
+CLIENT = UpstreamClient(BASE_URL, headers=headers, follow_redirects=True)
 
 # ─── Init MCP server ─────────────────────────────────────────
-mcp = FastMCP("My MCP Server")
+mcp = FastMCP("My MCP Server", lifespan=clients_lifespan(CLIENT))
 
 # ---------------- TOOLS ----------------
 # ─── Fivetran Tools ──────────────────────────────────────────
 @mcp.tool()
-def create_connection_for_postgress(connection_name, host, database):
+async def create_connection_for_postgress(connection_name, host, database):
     """
     Create a Fivetran PostgreSQL connector.
 
@@ -64,14 +68,14 @@ def create_connection_for_postgress(connection_name, host, database):
             "update_method": "TELEPORT"
         }
     }
-    response = requests.post(BASE_URL, json=payload, headers=headers, auth=auth)
-    data = response.json()
+    response = await CLIENT.post("/connectors", content=orjson.dumps(payload))
+    data = ok(response)
     conn_id = data["data"]["id"]
     return f"Connector created successfully! ID: {conn_id}"
 
 
 @mcp.tool()
-def get_all_connections():
+async def get_all_connections():
     """
     List all Fivetran connections in the account.
 
@@ -80,30 +84,48 @@ def get_all_connections():
             - conn_name (dict): Connector schema name.
             - id (dict): Connector ID.
     """
-    resp = requests.get(BASE_URL, auth=auth, headers=headers)
-    pairs = [({"conn_name": item["schema"]}, {"id": item["id"]}) for item in resp.json()["data"]["items"]]
+    resp = await CLIENT.get("/connectors")
+    pairs = [({"conn_name": item["schema"]}, {"id": item["id"]}) for item in ok(resp)["data"]["items"]]
     return pairs
 
 
+@cached()
+async def _fetch_connector(connector_id: str) -> dict:
+    resp = await CLIENT.get(f"/connectors/{connector_id}")
+    return ok(resp)["data"]
+
+
 @mcp.tool()
-def get_connector_info(connector_id: str) -> dict:
+async def get_connector_info(connector_id: str, fresh: bool = False) -> dict:
     """
     Retrieve metadata for a specific Fivetran connector.
 
     Args:
         connector_id (str): Unique ID of the connector (e.g., "postgres_abc123").
+        fresh (bool): Bypass the short-lived response cache (default: False).
 
     Returns:
         dict: Full connector object as returned by Fivetran API (resp.json()["data"]).
     """
-    url = f"{BASE_URL}/{connector_id}"
-    resp = requests.get(url, auth=auth, headers=headers)
-    resp.raise_for_status()
-    return resp.json()["data"]
+    return await _fetch_connector(connector_id, fresh=fresh)
+
+
+@mcp.tool()
+async def get_connectors_info(connector_ids: list[str]) -> dict:
+    """
+    Retrieve metadata for several Fivetran connectors concurrently.
+
+    Args:
+        connector_ids (list[str]): Unique IDs of the connectors.
+
+    Returns:
+        dict: Mapping of connector ID to the connector object, as in get_connector_info.
+    """
+    return dict(zip(connector_ids, await gather_bounded(_fetch_connector, connector_ids)))
 
 
 @mcp.tool()
-def sync_connection(connector_id):
+async def sync_connection(connector_id):
     """
     Trigger an immediate data sync for a Fivetran connector.
 
@@ -116,11 +138,12 @@ def sync_connection(connector_id):
     Returns:
         int: Status code from the Fivetran API indicating success or failure.
     """
-    url = f"{BASE_URL}/{connector_id}/sync"
     payload = {"force": True}
-    resp = requests.post(url, json=payload, headers=headers, auth=auth)
-    return resp.json()["code"]
+    resp = await CLIENT.post(f"/connectors/{connector_id}/sync", content=orjson.dumps(payload))
+    _fetch_connector.invalidate(connector_id)  # sync state changed
+    return ok(resp)["code"]
 
 # ---------------- RUN ----------------
 if __name__ == "__main__":
+    use_uvloop()
     mcp.run(transport="streamable-http", host="0.0.0.0", port=8000)
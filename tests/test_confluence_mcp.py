@@ -0,0 +1,102 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip("fastmcp")
+
+os.environ.setdefault("CONFLUENCE_BASE_URL", "https://example.atlassian.net/wiki")
+os.environ.setdefault("CONFLUENCE_USER", "user@example.com")
+os.environ.setdefault("CONFLUENCE_TOKEN", "token")
+
+from confluence_mcp import SUMMARY_LENGTH, SUMMARY_READ_BYTES, _json_string_prefix  # noqa: E402
+
+
+def _encoded_value(value: str, ensure_ascii: bool = True) -> bytes:
+    """Bytes of a JSON string literal, starting just after its opening quote."""
+    return json.dumps(value, ensure_ascii=ensure_ascii).encode()[1:] + b', "representation": "storage"}'
+
+
+def test_whole_string_in_window():
+    assert _json_string_prefix(_encoded_value('<p>short "page"</p>')) == ('<p>short "page"</p>', False)
+
+
+@pytest.mark.parametrize("value", [
+    "<p>plain text</p>\n" * 400,
+    'quote " and backslash \\ ' * 200,
+    "\\" * 3000,
+    "café " * 800,
+    "emoji \U0001F600 " * 400,
+])
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+def test_truncated_prefix_is_exact_prefix(value, ensure_ascii):
+    raw = _encoded_value(value, ensure_ascii)
+    # Cut at every offset near the window edge so partial escapes, escaped
+    # backslashes, split surrogate pairs and split UTF-8 bytes all get hit.
+    for cut in range(1000, 1013):
+        prefix, truncated = _json_string_prefix(raw[:cut])
+        assert truncated
+        assert value.startswith(prefix)
+        assert not any("\ud800" <= ch <= "\udfff" for ch in prefix)
+
+
+def test_window_holds_summary_for_surrogate_pairs():
+    value = "\U0001F600" * (SUMMARY_LENGTH * 2)
+    prefix, truncated = _json_string_prefix(_encoded_value(value)[:SUMMARY_READ_BYTES])
+    assert truncated
+    assert len(prefix) >= SUMMARY_LENGTH
+
+
+def test_clients_survive_lifespan_restart(monkeypatch):
+    import asyncio
+
+    import httpx
+    from fastmcp import Client
+
+    import confluence_mcp
+
+    def handler(request):
+        return httpx.Response(200, json={"results": [{"key": "ENG", "name": "Engineering"}]})
+
+    monkeypatch.setattr(httpx, "AsyncHTTPTransport", lambda **kwargs: httpx.MockTransport(handler))
+
+    async def session():
+        async with Client(confluence_mcp.mcp) as client:
+            result = await client.call_tool("navigate_spaces", {"fresh": True})
+            return json.loads(result.content[0].text)
+
+    async def main():
+        # Each in-memory session runs the server lifespan, which closes the
+        # clients on exit; the next session must get working ones again.
+        return [await session(), await session()]
+
+    assert asyncio.run(main()) == [[{"key": "ENG", "name": "Engineering"}]] * 2
+
+
+def test_list_pull_requests_many_rejects_malformed_repos(monkeypatch):
+    import asyncio
+
+    import httpx
+    from fastmcp import Client
+
+    import confluence_mcp
+
+    paths = []
+
+    def handler(request):
+        paths.append(request.url.path)
+        return httpx.Response(200, json=[{"number": 1, "title": "Fix", "state": "open", "user": {"login": "dev"}}])
+
+    monkeypatch.setattr(httpx, "AsyncHTTPTransport", lambda **kwargs: httpx.MockTransport(handler))
+    repos = ["octo/app", "noslash", "/repo", "owner/", "a/b/c"]
+
+    async def main():
+        async with Client(confluence_mcp.mcp) as client:
+            result = await client.call_tool("list_pull_requests_many", {"repos": repos})
+            return json.loads(result.content[0].text)
+
+    result = asyncio.run(main())
+    assert result["octo/app"] == [{"number": 1, "title": "Fix", "state": "open", "user": "dev"}]
+    for bad in repos[1:]:
+        assert "error" in result[bad]
+    assert paths == ["/repos/octo/app/pulls"]
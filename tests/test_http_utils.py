@@ -0,0 +1,271 @@
+import asyncio
+import datetime
+import email.utils
+import time
+
+import httpx
+import pytest
+
+import http_utils
+from http_utils import UpstreamClient, clients_lifespan
+
+
+@pytest.fixture
+def mock_upstream(monkeypatch):
+    """Route every make_client() transport to a handler the test controls."""
+    def install(handler):
+        monkeypatch.setattr(httpx, "AsyncHTTPTransport", lambda **kwargs: httpx.MockTransport(handler))
+    return install
+
+
+def test_lifespans_are_scoped_to_their_own_clients(mock_upstream):
+    mock_upstream(lambda request: httpx.Response(200))
+    conf = UpstreamClient("https://example.atlassian.net/wiki")
+    fivetran = UpstreamClient("https://api.fivetran.com/v1")
+
+    async def main():
+        inner = fivetran.client
+        async with clients_lifespan(conf)(None):
+            await conf.get("/")
+        # Closing the Confluence server must leave the Fivetran pool alone.
+        assert not inner.is_closed
+        assert (await fivetran.get("/")).status_code == 200
+        assert (await conf.get("/")).status_code == 200
+
+    asyncio.run(main())
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record backoff sleeps instead of waiting for them."""
+    recorded = []
+
+    async def fake_sleep(delay):
+        recorded.append(delay)
+
+    monkeypatch.setattr(asyncio, "sleep", fake_sleep)
+    return recorded
+
+
+def _send(handler, method="GET", limiter=None):
+    """Send one request through a RateLimitedTransport; return (response, attempts)."""
+    attempts = []
+
+    def record(request):
+        attempts.append(request.method)
+        return handler(request)
+
+    transport = http_utils.RateLimitedTransport(httpx.MockTransport(record), limiter or http_utils.HostRateLimiter())
+
+    async def main():
+        async with httpx.AsyncClient(base_url="https://api.example.com", transport=transport) as client:
+            return await client.request(method, "/thing")
+
+    return asyncio.run(main()), attempts
+
+
+def test_long_retry_after_is_returned_without_retrying(sleeps):
+    resp, attempts = _send(lambda request: httpx.Response(429, headers={"Retry-After": "3600"}))
+    assert resp.status_code == 429
+    assert attempts == ["GET"]
+    assert sleeps == []
+
+
+def _fail_then_ok(status, failures=1, headers=None):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) <= failures:
+            return httpx.Response(status, headers=headers)
+        return httpx.Response(200)
+
+    return handler
+
+
+def test_get_is_retried_on_5xx(sleeps):
+    resp, attempts = _send(_fail_then_ok(503, failures=2))
+    assert resp.status_code == 200
+    assert attempts == ["GET"] * 3
+    assert len(sleeps) == 2
+
+
+def test_get_gives_up_after_max_attempts(sleeps):
+    resp, attempts = _send(lambda request: httpx.Response(502))
+    assert resp.status_code == 502
+    assert len(attempts) == http_utils.MAX_ATTEMPTS
+
+
+def test_post_is_not_retried_on_5xx(sleeps):
+    resp, attempts = _send(_fail_then_ok(500), method="POST")
+    assert resp.status_code == 500
+    assert attempts == ["POST"]
+    assert sleeps == []
+
+
+@pytest.mark.parametrize("method", ["GET", "POST", "PATCH"])
+def test_429_is_retried_for_any_method(sleeps, method):
+    resp, attempts = _send(_fail_then_ok(429, headers={"Retry-After": "2"}), method=method)
+    assert resp.status_code == 200
+    assert attempts == [method] * 2
+    # The transport backs off for Retry-After (the limiter may also wait for
+    # the same reset, but the fake sleep does not advance its clock).
+    assert sleeps[0] == 2.0
+
+
+def test_transport_errors_are_retried_only_for_idempotent_methods(sleeps):
+    calls = []
+
+    def flaky(request):
+        calls.append(request.method)
+        if len(calls) == 1:
+            raise httpx.ConnectTimeout("timed out")
+        return httpx.Response(200)
+
+    resp, _ = _send(flaky)
+    assert resp.status_code == 200
+    assert calls == ["GET", "GET"]
+
+    calls.clear()
+    with pytest.raises(httpx.ConnectTimeout):
+        _send(flaky, method="POST")
+    assert calls == ["POST"]
+
+
+def test_parse_retry_after_seconds_and_http_date():
+    assert http_utils._parse_retry_after("120") == 120.0
+    assert http_utils._parse_retry_after("-5") == 0.0
+    in_a_minute = email.utils.formatdate(time.time() + 60, usegmt=True)
+    assert 55 <= http_utils._parse_retry_after(in_a_minute) <= 60
+    assert http_utils._parse_retry_after("soon") is None
+
+
+def test_parse_reset_epoch_and_iso():
+    # GitHub: epoch seconds.
+    assert 85 <= http_utils._parse_reset(str(int(time.time()) + 90)) <= 90
+    # Atlassian: ISO-8601 timestamp.
+    reset = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=90)
+    assert 85 <= http_utils._parse_reset(reset.isoformat().replace("+00:00", "Z")) <= 90
+    assert http_utils._parse_reset(str(int(time.time()) - 10)) == 0.0
+    assert http_utils._parse_reset("whenever") is None
+
+
+def test_limiter_tracks_rate_limit_headers():
+    limiter = http_utils.HostRateLimiter()
+    limiter.update("api.github.com", httpx.Headers({
+        "X-RateLimit-Remaining": "7",
+        "X-RateLimit-Reset": str(int(time.time()) + 90),
+    }))
+    state = limiter._state("api.github.com")
+    assert state.remaining == 7
+    assert 85 <= state.reset_at - time.monotonic() <= 90
+
+    limiter.update("api.github.com", httpx.Headers({"Retry-After": "3"}))
+    assert state.remaining == 0
+    assert 2 <= state.reset_at - time.monotonic() <= 3
+
+
+def test_limiter_waits_for_reset_when_bucket_is_empty(sleeps):
+    limiter = http_utils.HostRateLimiter()
+    limiter.update("api.example.com", httpx.Headers({"Retry-After": "5"}))
+
+    resp, attempts = _send(lambda request: httpx.Response(200), limiter=limiter)
+    assert resp.status_code == 200
+    assert attempts == ["GET"]
+    assert len(sleeps) == 1 and 4 <= sleeps[0] <= 5
+
+
+def test_limiter_does_not_block_on_a_distant_reset(sleeps):
+    limiter = http_utils.HostRateLimiter()
+    limiter.update("api.example.com", httpx.Headers({
+        "X-RateLimit-Remaining": "0",
+        "X-RateLimit-Reset": str(int(time.time()) + 3600),
+    }))
+
+    resp, attempts = _send(lambda request: httpx.Response(200), limiter=limiter)
+    assert attempts == ["GET"]
+    assert sleeps == []
+
+
+def _counting_fetch(ttl=http_utils.CACHE_TTL):
+    calls = []
+
+    @http_utils.cached(ttl=ttl)
+    async def fetch(item_id, limit=10):
+        calls.append(item_id)
+        return {"id": item_id, "limit": limit, "items": []}
+
+    return fetch, calls
+
+
+def test_cached_reuses_result_until_ttl_expires():
+    fetch, calls = _counting_fetch(ttl=0.05)
+
+    async def main():
+        await fetch("a")
+        await fetch("a", limit=10)    # same bound arguments, same entry
+        await fetch("a", limit=20)
+        time.sleep(0.1)
+        await fetch("a")
+
+    asyncio.run(main())
+    assert calls == ["a", "a", "a"]
+
+
+def test_cached_fresh_skips_lookup_and_refreshes_entry():
+    fetch, calls = _counting_fetch()
+
+    async def main():
+        await fetch("a")
+        await fetch("a", fresh=True)
+        await fetch("a")
+
+    asyncio.run(main())
+    assert calls == ["a", "a"]
+
+
+def test_cached_invalidate_and_clear():
+    fetch, calls = _counting_fetch()
+
+    async def main():
+        await fetch("a")
+        await fetch("b")
+        fetch.invalidate("a")
+        await fetch("a")
+        await fetch("b")
+        fetch.cache_clear()
+        await fetch("b")
+
+    asyncio.run(main())
+    assert calls == ["a", "b", "a", "b"]
+
+
+def test_cached_does_not_cache_failures():
+    calls = []
+
+    @http_utils.cached()
+    async def fetch(item_id):
+        calls.append(item_id)
+        if len(calls) == 1:
+            raise httpx.ConnectError("boom")
+        return {"id": item_id}
+
+    async def main():
+        with pytest.raises(httpx.ConnectError):
+            await fetch("a")
+        return await fetch("a")
+
+    assert asyncio.run(main()) == {"id": "a"}
+    assert calls == ["a", "a"]
+
+
+def test_cached_results_are_copies():
+    fetch, calls = _counting_fetch()
+
+    async def main():
+        first = await fetch("a")
+        first["items"].append("mutated")
+        return await fetch("a")
+
+    assert asyncio.run(main()) == {"id": "a", "limit": 10, "items": []}
+    assert calls == ["a"]